@@ -1,12 +1,22 @@
 import argparse
+import asyncio
+import atexit
+import functools
+import hashlib
+import io
+import itertools
 import json
 import os
+import pickle
 import re
 import sys
-from datetime import datetime, timedelta
+import textwrap
+import numpy as np
 import requests  # For API calls
 from google import genai
-from google.genai import types
+from google.genai import errors, types
+from pydantic import BaseModel, TypeAdapter
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 # Load environment variables from .env file if it exists
 try:
@@ -15,9 +25,12 @@ try:
 except ImportError:
     pass  # python-dotenv not installed, skip
 
+# Concatenated context is memoized here, keyed by the section files' mtime and size
+CONTEXT_CACHE_FILE = ".context_cache"
+
 #Load movie context from Wikipedia section files
 def load_movie_context(sections_dir="plan9_sections"):    
-    context_parts = []
+    context_buffer = io.StringIO()
     
     # Define the order of sections for better organization
     section_order = [
@@ -30,19 +43,55 @@ def load_movie_context(sections_dir="plan9_sections"):
         "Documentaries.txt",
     ]
     
-    for section_file in section_order:
-        file_path = os.path.join(sections_dir, section_file)
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if content:
-                        section_name = section_file.replace('.txt', '').replace('_', ' ')
-                        context_parts.append(f"=== {section_name.upper()} ===\n{content}")
-            except Exception as e:
-                print(f"Warning: Could not read {section_file}: {e}")
+    # List the directory once instead of probing each section file
+    try:
+        with os.scandir(sections_dir) as it:
+            entries = {entry.name: entry for entry in it if entry.is_file()}
+    except OSError:
+        return ""
+    
+    existing = [(section_file, entries[section_file]) for section_file in section_order if section_file in entries]
+    if not existing:
+        return ""
+    
+    # Reuse the concatenated context if no section file changed since it was built
+    fingerprint = hashlib.blake2b(
+        "|".join(f"{entry.path}:{entry.stat().st_mtime}:{entry.stat().st_size}" for _, entry in existing).encode()
+    ).hexdigest()
+    cache_path = os.path.join(sections_dir, CONTEXT_CACHE_FILE)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            if f.readline().rstrip('\n') == fingerprint:
+                return f.read()
+    except OSError:
+        pass
     
-    return "\n\n".join(context_parts)
+    read_failed = False
+    for section_file, entry in existing:
+        try:
+            with open(entry.path, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+                if content:
+                    section_name = section_file.replace('.txt', '').replace('_', ' ')
+                    if context_buffer.tell():
+                        context_buffer.write("\n\n")
+                    context_buffer.write(f"=== {section_name.upper()} ===\n")
+                    context_buffer.write(content)
+        except Exception as e:
+            print(f"Warning: Could not read {section_file}: {e}")
+            read_failed = True
+    
+    context = context_buffer.getvalue()
+    
+    # Never memoize an incomplete context; the next run should try every section again
+    if not read_failed:
+        try:
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                f.write(f"{fingerprint}\n{context}")
+        except OSError as e:
+            print(f"Warning: Could not write context cache: {e}", file=sys.stderr)
+    
+    return context
 
 # Load comprehensive movie context
 system_instruction = load_movie_context()
@@ -54,165 +103,410 @@ if not system_instruction:
     main_character_intro = "Pilot Jeff Trent, Wife Paula Trent, Lieutenant John Harper, Colonel Tom Edwards, The narrator, Patrolman Larry, Patrolman Kelton, Inspector Daniel Clay, and the alien invaders."
     system_instruction = f"{movie_intro}\ninfluence_intro\n{main_character_intro}"
 
-def parse_srt(file_path):
-    """Parse an SRT file into a list of subtitle entries."""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        content = file.read()
+# ASCII digits only; _srt_to_ms converts timestamps byte by byte
+_TS_RE = re.compile(r'(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})', re.ASCII)
+
+# States of the line-oriented SRT parser
+_INDEX, _TIMES, _TEXT = range(3)
+
+# Millisecond weight of each character in an HH:MM:SS,mmm timestamp (separators weigh 0)
+_TS_WEIGHTS = np.array([36000000, 3600000, 0, 600000, 60000, 0, 10000, 1000, 0, 100, 10, 1], dtype=np.int64)
+
+def _srt_to_ms(timestamps):
+    """Convert SRT timestamps (HH:MM:SS,mmm) to an array of total milliseconds."""
+    digits = np.array(timestamps, dtype='S12').view(np.uint8).reshape(-1, 12).astype(np.int64) - ord('0')
+    return digits @ _TS_WEIGHTS
+
+def parse_srt(file_path, min_pause_ms=4000):
+    """Parse an SRT file into columns of subtitle data, one row per subtitle.
     
-    # Split by blank lines to get subtitle blocks
-    subtitle_blocks = content.strip().split('\n\n')
-    subtitles = []
+    Returns a dict of arrays: 'index', 'start' and 'end' (timestamp strings),
+    'start_ms' and 'end_ms' (int64 milliseconds), 'text', and 'scene_break',
+    which is True where a subtitle follows a pause of at least min_pause_ms
+    and so starts a new scene.
+    """
+    indices, starts, ends, texts = [], [], [], []
+    state = _INDEX
+    index = times = None
+    text_lines = []
     
-    for block in subtitle_blocks:
-        lines = block.strip().split('\n')
-        if len(lines) < 3:
-            continue
-        
-        # Extract timestamp line
-        timestamp_line = lines[1]
-        times = re.findall(r'(\d{2}:\d{2}:\d{2},\d{3})', timestamp_line)
-        if len(times) != 2:
-            continue
-        
-        start_time, end_time = times
-        
-        # Join all text lines
-        text = ' '.join(lines[2:])
-        
-        subtitles.append({
-            'index': int(lines[0]),
-            'start': start_time,
-            'end': end_time,
-            'text': text
-        })
-    
-    return subtitles
-
-def group_into_scenes(subtitles, min_pause_seconds=4):
-    """Group subtitles into scenes based on pauses."""
-    scenes = []
-    current_scene = []
-    
-    for i, subtitle in enumerate(subtitles):
-        if not current_scene:
-            current_scene.append(subtitle)
-            continue
+    with open(file_path, 'r', encoding='utf-8') as file:
+        # The extra blank line flushes the final block
+        for line in itertools.chain(file, ['']):
+            line = line.strip()
             
-        # Check if there's a significant pause after the previous subtitle
-        prev_end = datetime.strptime(subtitles[i-1]['end'], '%H:%M:%S,%f')
-        current_start = datetime.strptime(subtitle['start'], '%H:%M:%S,%f')
-        
-        pause_duration = (current_start - prev_end).total_seconds()
-        
-        if pause_duration >= min_pause_seconds:
-            # End current scene
-            if current_scene:
-                scenes.append(current_scene)
-                current_scene = []
-        
-        current_scene.append(subtitle)
-    
-    # Add the last scene
-    if current_scene:
-        scenes.append(current_scene)
-    
-    return scenes
-
-def analyze_scene_with_llm(scene_text, model):
-    if model.startswith("gemini"):
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        model_name = model  # 例如 "gemini-2.0-flash"
-        prompt = f"""
-        Analyze this movie scene transcription:
-
-        "{scene_text}"
-
-        Provide a structured analysis with:
-        1. A one-sentence summary
-        2. Characters in the scene (list)
-        3. Overall mood/emotion, up to 3 words
-        4. Up to 3 cultural references (list, can be empty)
-
-        Please format your response as follows:
-        Summary: [your one-sentence summary]
-        Characters: [character1, character2, ...]
-        Mood: [mood/emotion]
-        Cultural References: [reference1, reference2, reference3] (or [] if none)
-        """
-        client = genai.Client(api_key=api_key)
+            # A blank line ends the current subtitle block
+            if not line:
+                if state == _TEXT and times and text_lines:
+                    start_time, end_time = times.groups()
+                    indices.append(int(index))
+                    starts.append(start_time)
+                    ends.append(end_time)
+                    texts.append(' '.join(text_lines))
+                state = _INDEX
+                text_lines = []
+                continue
+            
+            if state == _INDEX:
+                index = line
+                state = _TIMES
+            elif state == _TIMES:
+                # Blocks with a malformed timestamp line are skipped
+                times = _TS_RE.match(line)
+                state = _TEXT
+            else:
+                text_lines.append(line)
+    
+    start_ms = _srt_to_ms(starts)
+    end_ms = _srt_to_ms(ends)
+    
+    # Flag scene starts while both time columns are at hand
+    scene_break = np.ones(len(starts), dtype=bool)
+    scene_break[1:] = start_ms[1:] - end_ms[:-1] >= min_pause_ms
+    
+    return {
+        'index': np.array(indices, dtype=np.int64),
+        'start': np.array(starts, dtype=object),
+        'end': np.array(ends, dtype=object),
+        'start_ms': start_ms,
+        'end_ms': end_ms,
+        'text': np.array(texts, dtype=object),
+        'scene_break': scene_break
+    }
+
+def group_into_scenes(subtitles):
+    """Split subtitles at their scene breaks, returning one slice of subtitle rows per scene."""
+    edges = [*np.flatnonzero(subtitles['scene_break']).tolist(), len(subtitles['text'])]
+    return [slice(start, end) for start, end in zip(edges[:-1], edges[1:])]
+
+# Gemini rejects explicit caches smaller than this many tokens
+MIN_CACHE_TOKENS = 4096
 
+@functools.lru_cache(maxsize=None)
+def create_gemini_client(model):
+    """Create the single Gemini client shared by all scene requests."""
+    if not model.startswith("gemini"):
+        raise ValueError(f"Unsupported model: {model}")
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    return genai.Client(api_key=api_key)
+
+def delete_context_cache(client, cache_name):
+    try:
+        client.caches.delete(name=cache_name)
+    except Exception as e:
+        print(f"Warning: Could not delete context cache {cache_name}: {e}", file=sys.stderr)
+
+def create_context_cache(client, model):
+    """Cache the movie context once for the whole run.
+    
+    Returns the cache name, or None when the context is too small to cache
+    and has to be sent inline with every request instead.
+    """
+    # Roughly 4 characters per token; saves a count_tokens round trip
+    approx_tokens = len(system_instruction) // 4
+    if approx_tokens < MIN_CACHE_TOKENS:
+        print(f"Movie context is ~{approx_tokens} tokens, below the {MIN_CACHE_TOKENS}-token caching minimum; "
+              "sending it inline with each request", file=sys.stderr)
+        return None
+    
+    try:
         cache = client.caches.create(
-            model=model_name,
+            model=model,
             config=types.CreateCachedContentConfig(
                 system_instruction=system_instruction,
-            )
-        )        
-        cache_name = cache.name        
-        #print("the cache is saved as: cache_name:", cache_name)
-
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[prompt],
-            config=types.GenerateContentConfig(
-                cached_content=cache_name
+                ttl="3600s",
             )
         )
-        return parse_llm_response(response.text)
+    except errors.ClientError as e:
+        # The estimate can overshoot near the minimum; Gemini then rejects the cache
+        print(f"Could not cache the movie context ({e}); sending it inline with each request", file=sys.stderr)
+        return None
+    atexit.register(delete_context_cache, client, cache.name)
+    print(f"Movie context (~{approx_tokens} tokens) cached as {cache.name}", file=sys.stderr)
+    return cache.name
+
+def _is_retryable(exception):
+    """Rate limits (429) and server-side failures (5xx) are worth retrying."""
+    if isinstance(exception, errors.ServerError):
+        return True
+    return isinstance(exception, errors.ClientError) and exception.code == 429
+
+def _log_retry(retry_state):
+    print(f"Warning: Gemini request failed ({retry_state.outcome.exception()}), "
+          f"retrying (attempt {retry_state.attempt_number})", file=sys.stderr)
+
+# Only the failing request backs off; other batches carry on in the meantime
+_llm_retry = retry(
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(6),
+    retry=retry_if_exception(_is_retryable),
+    before_sleep=_log_retry,
+    reraise=True,
+)
+
+# Summary of the placeholder analysis used when a response cannot be parsed
+FAILED_SUMMARY = "Analysis parsing failed"
+
+class SceneAnalysis(BaseModel):
+    """Response schema Gemini enforces for each analyzed scene."""
+    summary: str
+    characters: list[str]
+    mood: str
+    cultural_refs: list[str]
+
+# Validates a whole batch response against the schema Gemini was given
+_SCENE_ANALYSES = TypeAdapter(list[SceneAnalysis])
+
+_SCENE_TEMPLATE = 'Scene {number}:\n"{text}"'
+
+_PROMPT_TEMPLATE = """
+Analyze the following {scene_count} movie scene transcriptions:
+
+{scenes}
+
+For each scene, provide a structured analysis with:
+1. A one-sentence summary
+2. Characters in the scene (list)
+3. Overall mood/emotion, up to 3 words
+4. Up to 3 cultural references (list, can be empty)
+
+Respond with exactly {scene_count} analyses, one per scene in the order given.
+"""
+
+@_llm_retry
+async def analyze_batch_with_llm_async(scene_texts, model, client, cache_name):
+    """Analyze a batch of scenes in a single request, returning one analysis per scene."""
+    scenes_block = "\n\n".join(
+        _SCENE_TEMPLATE.format(number=i, text=scene_text) for i, scene_text in enumerate(scene_texts, 1)
+    )
+    prompt = _PROMPT_TEMPLATE.format(scene_count=len(scene_texts), scenes=scenes_block)
+    if cache_name:
+        config = types.GenerateContentConfig(
+            cached_content=cache_name,
+            response_mime_type="application/json",
+            response_schema=list[SceneAnalysis],
+        )
     else:
-        raise ValueError(f"Unsupported model: {model}")
+        config = types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            response_mime_type="application/json",
+            response_schema=list[SceneAnalysis],
+        )
+
+    response = await client.aio.models.generate_content(
+        model=model,
+        contents=[prompt],
+        config=config
+    )
+    return parse_llm_response(response.text, len(scene_texts))
+
+def parse_llm_response(response_text, scene_count):
+    """Parse the LLM's JSON array response into one analysis per scene.
+    
+    Raises ValueError (pydantic's ValidationError is one) when the response
+    does not match the SceneAnalysis schema or does not hold exactly one
+    analysis per scene.
+    """
+    analyses = _SCENE_ANALYSES.validate_json(response_text or "")
+    if len(analyses) != scene_count:
+        raise ValueError(f"Expected {scene_count} scene analyses, got {len(analyses)}")
+    return [analysis.model_dump() for analysis in analyses]
 
-def parse_llm_response(response_text):
-    """Parse the LLM response text into structured data."""
+async def analyze_batch_or_split(scene_texts, model, client, cache_name):
+    """Analyze a batch, re-requesting it as two halves whenever its response can't be matched to the scenes.
+    
+    A single scene that still fails gets a placeholder analysis instead.
+    """
     try:
-        # Initialize default values
-        analysis = {
-            "summary": "",
-            "characters": [],
-            "mood": "",
-            "cultural_refs": []
-        }
-        
-        lines = response_text.strip().split('\n')
+        return await analyze_batch_with_llm_async(scene_texts, model, client, cache_name)
+    except ValueError as e:
+        if len(scene_texts) == 1:
+            print(f"Warning: Could not parse scene analysis ({e}), using a placeholder", file=sys.stderr)
+            return [{
+                "summary": FAILED_SUMMARY,
+                "characters": [],
+                "mood": "unknown",
+                "cultural_refs": []
+            }]
         
-        for line in lines:
-            line = line.strip()
-            if line.startswith("Summary:"):
-                analysis["summary"] = line.replace("Summary:", "").strip()
-            elif line.startswith("Characters:"):
-                chars_text = line.replace("Characters:", "").strip()
-                # Parse list format [item1, item2, ...] or comma-separated
-                if chars_text.startswith('[') and chars_text.endswith(']'):
-                    chars_text = chars_text[1:-1]
-                if chars_text:
-                    analysis["characters"] = [char.strip() for char in chars_text.split(',') if char.strip()]
-            elif line.startswith("Mood:"):
-                analysis["mood"] = line.replace("Mood:", "").strip()
-            elif line.startswith("Cultural References:"):
-                refs_text = line.replace("Cultural References:", "").strip()
-                # Parse list format [item1, item2, ...] or comma-separated
-                if refs_text.startswith('[') and refs_text.endswith(']'):
-                    refs_text = refs_text[1:-1]
-                if refs_text and refs_text != "[]":
-                    analysis["cultural_refs"] = [ref.strip() for ref in refs_text.split(',') if ref.strip()]
+        print(f"Warning: {e}, retrying the {len(scene_texts)} scenes as two smaller batches", file=sys.stderr)
+        middle = len(scene_texts) // 2
+        # Run the halves one after the other so the caller's concurrency slot is respected
+        first = await analyze_batch_or_split(scene_texts[:middle], model, client, cache_name)
+        second = await analyze_batch_or_split(scene_texts[middle:], model, client, cache_name)
+        return first + second
+
+# Analyses from previous runs are persisted here between runs
+ANALYSIS_CACHE_FILE = ".scene_cache.pkl"
+
+# Semantic cache lookups reuse an analysis when embeddings are at least this similar
+EMBEDDING_MODEL = "text-embedding-004"
+EMBEDDING_BATCH_SIZE = 100
+SIMILARITY_THRESHOLD = 0.97
+
+def load_analysis_cache(path):
+    """Load cached analysis pools, keyed by analysis_pool_key.
+    
+    Each pool holds 'analyses' and 'embeddings' dicts keyed by scene_cache_key.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Warning: Could not read analysis cache {path}: {e}", file=sys.stderr)
+    return {}
+
+def save_analysis_cache(analysis_cache, path):
+    try:
+        with open(path, 'wb') as f:
+            pickle.dump(analysis_cache, f)
+    except OSError as e:
+        print(f"Warning: Could not write analysis cache {path}: {e}", file=sys.stderr)
+
+def analysis_pool_key(model):
+    """Fingerprint everything besides the scene text that shapes an analysis.
+    
+    Changing the model, the movie context, the prompt or the response schema
+    starts a fresh pool, so stale analyses and embeddings are never reused.
+    """
+    parts = [
+        model,
+        system_instruction,
+        _PROMPT_TEMPLATE,
+        _SCENE_TEMPLATE,
+        json.dumps(SceneAnalysis.model_json_schema(), sort_keys=True),
+    ]
+    return hashlib.blake2b("\0".join(parts).encode()).hexdigest()
+
+def scene_cache_key(scene_text):
+    return hashlib.blake2b(scene_text.encode()).hexdigest()
+
+@_llm_retry
+async def embed_scenes(client, scene_texts):
+    """Embed scene texts for semantic cache lookups, one row per scene."""
+    vectors = []
+    for start in range(0, len(scene_texts), EMBEDDING_BATCH_SIZE):
+        result = await client.aio.models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=scene_texts[start:start + EMBEDDING_BATCH_SIZE]
+        )
+        vectors.extend(embedding.values for embedding in result.embeddings)
+    return np.array(vectors, dtype=np.float32)
+
+async def analyze_scenes(scene_texts, model, analysis_cache, batch_size=20, concurrency=10, semantic=False):
+    """Analyze scenes in concurrent batches, yielding lists of (scene index, analysis) as they become available.
+    
+    Scenes found in this model and context's pool of analysis_cache, exactly
+    or (with semantic) by embedding similarity, are yielded first without an
+    LLM request. Identical scenes are only sent once. New analyses are added
+    to the pool. The Gemini client and context cache are only created once a
+    lookup actually needs the API.
+    """
+    pool = analysis_cache.setdefault(analysis_pool_key(model), {"analyses": {}, "embeddings": {}})
+    analyses = pool["analyses"]
+    embeddings = pool["embeddings"]
+    
+    # Group scene indices by cache key so repeated scenes share one analysis
+    misses = {}
+    hits = []
+    for i, scene_text in enumerate(scene_texts):
+        key = scene_cache_key(scene_text)
+        if key in analyses:
+            hits.append((i, analyses[key]))
+        else:
+            misses.setdefault(key, []).append(i)
+    
+    new_vectors = {}
+    if semantic and misses:
+        miss_keys = list(misses)
+        vectors = await embed_scenes(create_gemini_client(model), [scene_texts[misses[key][0]] for key in miss_keys])
+        new_vectors = dict(zip(miss_keys, vectors))
         
-        return analysis
+        if embeddings:
+            cached_keys = list(embeddings)
+            cached = np.stack([embeddings[key] for key in cached_keys])
+            similarity = (vectors @ cached.T) / np.outer(np.linalg.norm(vectors, axis=1), np.linalg.norm(cached, axis=1))
+            best = similarity.argmax(axis=1)
+            for row, key in enumerate(miss_keys):
+                if similarity[row, best[row]] >= SIMILARITY_THRESHOLD:
+                    analysis = analyses[key] = analyses[cached_keys[best[row]]]
+                    embeddings[key] = new_vectors[key]
+                    hits.extend((i, analysis) for i in misses.pop(key))
+    
+    if hits:
+        yield hits
+    if not misses:
+        return
+    
+    # Only scenes missing from the cache need the client and the movie context cache
+    client = create_gemini_client(model)
+    cache_name = create_context_cache(client, model)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def analyze(batch_keys):
+        async with semaphore:
+            batch = [scene_texts[misses[key][0]] for key in batch_keys]
+            return batch_keys, await analyze_batch_or_split(batch, model, client, cache_name)
+    
+    # Submit every batch first, then consume them in completion order
+    miss_keys = list(misses)
+    tasks = [analyze(miss_keys[start:start + batch_size]) for start in range(0, len(miss_keys), batch_size)]
+    for next_batch in asyncio.as_completed(tasks):
+        batch_keys, batch_analyses = await next_batch
+        results = []
+        for key, analysis in zip(batch_keys, batch_analyses):
+            if analysis["summary"] != FAILED_SUMMARY:
+                analyses[key] = analysis
+                if key in new_vectors:
+                    embeddings[key] = new_vectors[key]
+            results.extend((i, analysis) for i in misses[key])
+        yield results
+
+async def write_results(subtitles, scenes, scene_texts, results, out):
+    """Stream scene entries to out as a JSON array, in scene order, as analyses arrive."""
+    pending = {}
+    next_index = 0
+    separator = "[\n"
+    
+    async for batch in results:
+        pending.update(batch)
+        print(f"Analyzed {len(pending) + next_index}/{len(scenes)} scenes", file=sys.stderr)
         
-    except Exception as e:
-        # Fallback: return basic analysis if parsing fails
-        return {
-            "summary": "Analysis parsing failed",
-            "characters": [],
-            "mood": "unknown",
-            "cultural_refs": []
-        }
+        # Flush every analysis that now directly follows what has been written
+        while next_index in pending:
+            analysis = pending.pop(next_index)
+            scene = scenes[next_index]
+            entry = {
+                "start": subtitles["start"][scene.start],
+                "end": subtitles["end"][scene.stop - 1],
+                "transcript": scene_texts[next_index],
+                "summary": analysis["summary"],
+                "characters": analysis["characters"],
+                "mood": analysis["mood"],
+                "cultural_refs": analysis["cultural_refs"]
+            }
+            # Indent entries to match json.dumps(results, indent=2)
+            out.write(separator)
+            out.write(textwrap.indent(json.dumps(entry, indent=2), "  "))
+            separator = ",\n"
+            next_index += 1
+    
+    out.write("\n]" if next_index else "[]")
 
 def main():
     parser = argparse.ArgumentParser(description="LLM-powered scene analyzer for subtitle files")
     parser.add_argument("srt_file", help="Path to the .srt subtitle file")
     parser.add_argument("--model", default="gemini-2.0-flash", help="LLM model to use (e.g., openai:gpt-4o)")
     parser.add_argument("--output", default="output.json", help="Output JSON file path")
+    parser.add_argument("--batch-size", type=int, default=20, help="Number of scenes analyzed per LLM request")
+    parser.add_argument("--concurrency", type=int, default=10, help="Maximum number of concurrent LLM requests")
+    parser.add_argument("--cache", default=ANALYSIS_CACHE_FILE, help="File used to cache scene analyses between runs")
+    parser.add_argument("--no-cache", action="store_true", help="Analyze every scene without reading or writing the cache")
+    parser.add_argument("--semantic-cache", action="store_true", help="Also reuse cached analyses of near-identical scenes, matched by embedding similarity")
     args = parser.parse_args()
     
     # Parse SRT file
@@ -221,33 +515,32 @@ def main():
     # Group into scenes
     scenes = group_into_scenes(subtitles)
     
-    # Analyze each scene
-    results = []
-    for scene in scenes:
-        scene_text = " ".join(sub["text"] for sub in scene)
-        scene_start = scene[0]["start"]
-        scene_end = scene[-1]["end"]
-        
-        analysis = analyze_scene_with_llm(scene_text, args.model)
-        
-        results.append({
-            "start": scene_start,
-            "end": scene_end,
-            "transcript": scene_text,
-            "summary": analysis["summary"],
-            "characters": analysis["characters"],
-            "mood": analysis["mood"],
-            "cultural_refs": analysis["cultural_refs"]
-        })
-    
-    # Output results
-    output_json = json.dumps(results, indent=2)
-    
-    if args.output:
-        with open(args.output, 'w', encoding='utf-8') as f:
-            f.write(output_json)
-    else:
-        print(output_json)
+    # Analyze all scenes in concurrent batches, writing results as they complete.
+    # The client and movie context cache are created only if some scene misses the analysis cache.
+    analysis_cache = {} if args.no_cache else load_analysis_cache(args.cache)
+    scene_texts = [" ".join(subtitles["text"][scene]) for scene in scenes]
+    results = analyze_scenes(scene_texts, args.model, analysis_cache,
+                             args.batch_size, args.concurrency, args.semantic_cache)
+    
+    try:
+        if args.output:
+            # Stream into a temporary file so a failed run leaves any previous output intact
+            tmp_path = f"{args.output}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    asyncio.run(write_results(subtitles, scenes, scene_texts, results, f))
+                os.replace(tmp_path, args.output)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        else:
+            asyncio.run(write_results(subtitles, scenes, scene_texts, results, sys.stdout))
+            print()
+    finally:
+        # Keep every analysis finished so far, even if a later batch failed
+        if not args.no_cache:
+            save_analysis_cache(analysis_cache, args.cache)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,4 +1,5 @@
-import requests
+import aiohttp
+import asyncio
 from bs4 import BeautifulSoup
 import re
 import os
@@ -6,6 +7,11 @@ import os
 # Wikipedia page URL
 URL = "https://en.wikipedia.org/wiki/Plan_9_from_Outer_Space"
 
+# Add headers to mimic a real browser
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
 def clean_filename(title):
     # Keep only alphanumeric characters and underscores
     return re.sub(r'[^a-zA-Z0-9_]', '_', title)
@@ -21,19 +27,51 @@ def extract_text_content(element):
     
     return element.get_text(separator=" ", strip=True)
 
+def collect_section_text(elements):
+    """Extract the text of each element, keeping only substantial paragraphs"""
+    # get_text(strip=True) already trims the text, so it is measured as-is
+    texts = (extract_text_content(elem) for elem in elements)
+    return [text for text in texts if len(text) > 20]
+
+def split_at_headings(elements, is_heading):
+    """Partition a flat element list into (heading, elements up to the next heading) pairs"""
+    positions = [i for i, element in enumerate(elements) if is_heading(element)]
+    ends = positions[1:] + [len(elements)]
+    return [(elements[start], elements[start + 1:end]) for start, end in zip(positions, ends)]
+
+async def fetch(url, session):
+    """Fetch the raw bytes of a page, raising on HTTP errors"""
+    async with session.get(url, headers=HEADERS) as response:
+        response.raise_for_status()
+        return await response.read()
+
+async def fetch_pages(urls):
+    """Fetch several pages concurrently over one pooled keep-alive session"""
+    async with aiohttp.ClientSession() as session:
+        return await asyncio.gather(*(fetch(url, session) for url in urls))
+
+def write_section(out_dir, title, content):
+    """Write one section to its own text file"""
+    filename = f"{clean_filename(title)}.txt"
+    filepath = os.path.join(out_dir, filename)
+    
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write(f"# {title}\n\n{content}\n")
+    
+    print(f"SAVED: {filename} ({len(content)} characters)")
+
+async def write_sections(out_dir, sections):
+    """Write all sections concurrently, submitting every write before awaiting any"""
+    await asyncio.gather(*(asyncio.to_thread(write_section, out_dir, title, content) for title, content in sections))
+
 def main():
     print("Fetching Wikipedia page...")
     
-    # Add headers to mimic a real browser
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    html, = asyncio.run(fetch_pages([URL]))
+    print(f"Page fetched successfully, {len(html)} bytes")
     
-    resp = requests.get(URL, headers=headers)
-    resp.raise_for_status()
-    print(f"Page fetched successfully, status code: {resp.status_code}")
-    
-    soup = BeautifulSoup(resp.text, "html.parser")
+    # Parse the raw bytes with lxml; Wikipedia always serves UTF-8, so skip charset detection
+    soup = BeautifulSoup(html, "lxml", from_encoding="utf-8")
 
     # Find main content area
     content_div = soup.find("div", {"class": "mw-parser-output"})
@@ -43,21 +81,28 @@ def main():
     
     print("SUCCESS: Main content area found")
     
-    # Find all heading divs with the new structure
-    heading_divs = content_div.find_all("div", {"class": "mw-heading"})
-    print(f"Found {len(heading_divs)} heading divs")
-    
-    # Also try to find direct h2 elements as backup
-    direct_h2s = content_div.find_all("h2")
-    print(f"Found {len(direct_h2s)} direct h2 elements")
+    # Partition the top-level elements at heading divs (new structure) and at h2s (old structure).
+    # Headings nested deeper than the top level yield empty partitions, so extraction falls through.
+    heading_sections = split_at_headings(
+        content_div.find_all(["div", "p", "ul", "ol", "dl", "table"], recursive=False),
+        lambda element: 'mw-heading' in element.get('class', [])
+    )
+    print(f"Found {len(heading_sections)} top-level heading divs")
+    
+    # Also try direct h2 elements as backup
+    h2_sections = split_at_headings(
+        content_div.find_all(["h2", "p", "ul", "ol", "dl"], recursive=False),
+        lambda element: element.name == 'h2'
+    )
+    print(f"Found {len(h2_sections)} top-level h2 elements")
     
     sections = []
     
     # Method 1: Use the new mw-heading structure
-    if heading_divs:
+    if heading_sections:
         print("\nUsing mw-heading structure...")
         
-        for i, heading_div in enumerate(heading_divs):
+        for i, (heading_div, following) in enumerate(heading_sections):
             # Get the h2 element inside the div
             h2_element = heading_div.find("h2")
             if not h2_element:
@@ -66,34 +111,16 @@ def main():
             section_title = h2_element.get_text().strip()
             print(f"Processing section {i+1}: {section_title}")
             
-            # Find content after this heading div until the next heading div
+            # Collect content elements up to the next heading div
             content_elements = []
-            current_element = heading_div.next_sibling
-            
-            while current_element:
-                # Stop when we hit the next heading div
-                if (hasattr(current_element, 'get') and 
-                    current_element.get('class') and 
-                    'mw-heading' in current_element.get('class', [])):
-                    break
-                
-                # Collect content elements
-                if hasattr(current_element, 'name'):
-                    if current_element.name in ['p', 'ul', 'ol', 'dl', 'table']:
-                        content_elements.append(current_element)
-                    elif current_element.name == 'div':
-                        # Look for content inside divs
-                        inner_content = current_element.find_all(['p', 'ul', 'ol', 'dl'])
-                        content_elements.extend(inner_content)
-                
-                current_element = current_element.next_sibling
+            for element in following:
+                if element.name == 'div':
+                    # Look for content inside divs
+                    content_elements.extend(element.find_all(['p', 'ul', 'ol', 'dl']))
+                else:
+                    content_elements.append(element)
             
-            # Extract text from collected elements
-            section_content = []
-            for elem in content_elements:
-                text = extract_text_content(elem)
-                if text and len(text.strip()) > 20:
-                    section_content.append(text)
+            section_content = collect_section_text(content_elements)
             
             if section_content:
                 content_text = "\n\n".join(section_content)
@@ -103,32 +130,14 @@ def main():
                 print(f"  WARNING: No substantial content found for {section_title}")
     
     # Method 2: Fallback to direct h2 elements
-    elif direct_h2s:
+    if not sections and h2_sections:
         print("\nFallback: Using direct h2 elements...")
         
-        for i, h2 in enumerate(direct_h2s):
+        for i, (h2, content_elements) in enumerate(h2_sections):
             section_title = h2.get_text().strip()
             print(f"Processing section {i+1}: {section_title}")
             
-            # Find content after this h2
-            content_elements = []
-            current_element = h2.next_sibling
-            
-            while current_element:
-                if current_element.name == 'h2':
-                    break
-                
-                if hasattr(current_element, 'name') and current_element.name in ['p', 'ul', 'ol', 'dl']:
-                    content_elements.append(current_element)
-                
-                current_element = current_element.next_sibling
-            
-            # Extract text
-            section_content = []
-            for elem in content_elements:
-                text = extract_text_content(elem)
-                if text and len(text.strip()) > 20:
-                    section_content.append(text)
+            section_content = collect_section_text(content_elements)
             
             if section_content:
                 content_text = "\n\n".join(section_content)
@@ -140,12 +149,7 @@ def main():
     # If still no sections, extract introduction
     if not sections:
         print("No sections found. Extracting introduction...")
-        intro_content = []
-        
-        for elem in content_div.find_all('p'):
-            text = extract_text_content(elem)
-            if text and len(text.strip()) > 20:
-                intro_content.append(text)
+        intro_content = collect_section_text(content_div.find_all('p'))
         
         if intro_content:
             intro_text = "\n\n".join(intro_content)
@@ -157,24 +161,19 @@ def main():
     os.makedirs(out_dir, exist_ok=True)
     
     # Clear existing files
-    for filename in os.listdir(out_dir):
-        if filename.startswith("plan9_") and filename.endswith(".txt"):
-            os.remove(os.path.join(out_dir, filename))
+    with os.scandir(out_dir) as it:
+        for entry in it:
+            if entry.name.startswith("plan9_") and entry.name.endswith(".txt"):
+                os.unlink(entry.path)
     
-    for title, content in sections:
-        filename = f"{clean_filename(title)}.txt"
-        filepath = os.path.join(out_dir, filename)
-        
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(f"# {title}\n\n{content}\n")
-        
-        print(f"SAVED: {filename} ({len(content)} characters)")
+    asyncio.run(write_sections(out_dir, sections))
 
     print(f"\nCOMPLETE! {len(sections)} files saved in {out_dir}/ directory")
     
     # List all created files
     if os.path.exists(out_dir):
-        files = [f for f in os.listdir(out_dir) if f.startswith("plan9_")]
+        with os.scandir(out_dir) as it:
+            files = [entry.name for entry in it if entry.name.startswith("plan9_")]
         print(f"Created files:")
         for file in sorted(files):
             print(f"  - {file}")